@@ -1,8 +1,14 @@
 import os
+import shutil
+import subprocess
+import threading
 import tkinter as tk
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from tkinter import messagebox
 from PIL import Image
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
 
 try:
     import pydds
@@ -14,25 +20,27 @@ try:
 except ImportError:
     tqdm = None
 
+# DirectXTex's texconv block-compresses on the GPU; pydds is only used when it isn't on PATH
+texconv_path = shutil.which("texconv")
+texconv_format = "BC7_UNORM"
+texconv_batch_size = 32
+
 # Set up logging
 log_file = "conversion_log.txt"
 logging.basicConfig(filename=log_file, level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
-logging.info("Script started.")
 
 # Directory paths
 input_dir = r"C:\Users\Sabbo\LifeDrawingGallery\UV Maps"
 output_dir = r"C:\Users\Sabbo\LifeDrawingGallery\Converted"
 
 # Create output directory if it doesn't exist
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
-    logging.info(f"Created output directory: {output_dir}")
+os.makedirs(output_dir, exist_ok=True)
 
 # Dependency Check
 def check_dependencies():
     missing = []
-    if not pydds:
-        missing.append("pydds")
+    if not pydds and not texconv_path:
+        missing.append("pydds (or texconv on PATH)")
     if not tqdm:
         missing.append("tqdm")
     if missing:
@@ -44,6 +52,14 @@ def check_dependencies():
         return False
     return True
 
+# Route a worker process's log records to the main process, which does the formatting and file writes
+def init_worker_logging(log_queue):
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(QueueHandler(log_queue))
+
 # Convert PNG to DDS
 def convert_png_to_dds(input_path, output_path):
     try:
@@ -57,6 +73,24 @@ def convert_png_to_dds(input_path, output_path):
         logging.error(f"Error converting {input_path}: {e}")
         return False
 
+# Convert a batch of PNGs to DDS with a single texconv run
+def convert_pngs_with_texconv(input_paths, output_dir):
+    try:
+        logging.info(f"Converting {len(input_paths)} files with texconv ({texconv_format})")
+        result = subprocess.run(
+            [texconv_path, "-nologo", "-y", "-f", texconv_format, "-o", output_dir, *input_paths],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            logging.error(f"texconv failed on batch starting {input_paths[0]}: {result.stderr or result.stdout}")
+            return 0
+        logging.info(f"Successfully converted batch starting {input_paths[0]}")
+        return len(input_paths)
+    except Exception as e:
+        logging.error(f"Error running texconv on batch starting {input_paths[0]}: {e}")
+        return 0
+
 # GUI Application
 class ConversionApp:
     def __init__(self, root):
@@ -71,9 +105,16 @@ class ConversionApp:
         self.start_button = tk.Button(root, text="Start Conversion", command=self.start_conversion, font=("Arial", 12))
         self.start_button.pack(pady=10)
         
+        self.cancel_button = tk.Button(root, text="Cancel", command=self.cancel_conversion, font=("Arial", 12), state=tk.DISABLED)
+        self.cancel_button.pack(pady=10)
+        
         self.quit_button = tk.Button(root, text="Quit", command=self.quit_app, font=("Arial", 12))
         self.quit_button.pack(pady=10)
 
+        # Conversion runs on a worker thread so the window stays responsive
+        self.cancel_event = threading.Event()
+        self.pool = None
+
     def update_progress(self, percentage):
         self.progress_label.config(text=f"Progress: {percentage}%")
 
@@ -89,28 +130,80 @@ class ConversionApp:
             return
         
         # Find PNG files
-        png_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.png')]
+        with os.scandir(input_dir) as entries:
+            png_files = [entry.name for entry in entries if entry.name.lower().endswith('.png') and entry.is_file()]
         if not png_files:
             messagebox.showinfo("No Files", "No PNG files found in the input directory.")
             logging.warning("No PNG files found in the directory.")
             return
 
-        # Start Conversion
+        self.cancel_event.clear()
+        self.start_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.update_progress(0)
+        threading.Thread(target=self.run_conversion, args=(png_files,), daemon=True).start()
+
+    def run_conversion(self, png_files):
+        # Runs on the worker thread; all widget updates are handed back to Tk with root.after
+        # Batched texconv runs when available, otherwise pydds across all but one core
         total_files = len(png_files)
         successful_conversions = 0
-        for i, png_file in enumerate(png_files):
-            input_path = os.path.join(input_dir, png_file)
-            output_path = os.path.join(output_dir, png_file.replace('.png', '.dds'))
-            
-            if convert_png_to_dds(input_path, output_path):
-                successful_conversions += 1
-            
-            # Update progress
-            progress_percentage = int(((i + 1) / total_files) * 100)
-            self.update_progress(progress_percentage)
-        
+        completed = 0
+        if texconv_path:
+            jobs = [
+                (convert_pngs_with_texconv, [os.path.join(input_dir, f) for f in png_files[i:i + texconv_batch_size]], output_dir)
+                for i in range(0, total_files, texconv_batch_size)
+            ]
+            max_workers = 1  # Each texconv run already keeps the GPU busy
+        else:
+            jobs = [
+                (convert_png_to_dds, os.path.join(input_dir, png_file), os.path.join(output_dir, png_file.replace('.png', '.dds')))
+                for png_file in png_files
+            ]
+            max_workers = max(1, (os.cpu_count() or 2) - 1)
+
+        # Worker processes queue their log records; the listener writes them from this process
+        log_queue = multiprocessing.Queue()
+        listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+        listener.start()
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker_logging, initargs=(log_queue,)) as pool:
+                self.pool = pool
+                futures = {
+                    pool.submit(func, source, target): len(source) if isinstance(source, list) else 1
+                    for func, source, target in jobs
+                }
+                for future in as_completed(futures):
+                    if self.cancel_event.is_set():
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        break
+                    successful_conversions += int(future.result())
+                    completed += futures[future]
+
+                    # Update progress
+                    progress_percentage = int((completed / total_files) * 100)
+                    self.root.after(0, self.update_progress, progress_percentage)
+        finally:
+            listener.stop()
+        self.pool = None
+
+        self.root.after(0, self.finish_conversion, successful_conversions, total_files)
+
+    def cancel_conversion(self):
+        self.cancel_event.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        pool = self.pool
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        logging.warning("Conversion cancelled by user.")
+
+    def finish_conversion(self, successful_conversions, total_files):
+        self.start_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+
         # Show summary
-        summary = f"Conversion complete: {successful_conversions}/{total_files} files successfully converted."
+        status = "cancelled" if self.cancel_event.is_set() else "complete"
+        summary = f"Conversion {status}: {successful_conversions}/{total_files} files successfully converted."
         logging.info(summary)
         messagebox.showinfo("Summary", summary)
 
@@ -119,6 +212,7 @@ class ConversionApp:
 
 # Run the application
 if __name__ == "__main__":
+    logging.info("Script started.")
     try:
         root = tk.Tk()
         app = ConversionApp(root)
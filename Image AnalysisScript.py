@@ -2,10 +2,24 @@ import os
 from PIL import Image
 import numpy as np
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener
 import json
+from concurrent.futures import ProcessPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log = logging.getLogger(__name__)
+
+# Route a worker process's log records to the main process, which does the formatting and file writes
+def init_worker_logging(log_queue):
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+        handler.close()
+    root_logger.addHandler(QueueHandler(log_queue))
 
 def detect_borders(image_np, tolerance=5):
     """
@@ -13,39 +27,26 @@ def detect_borders(image_np, tolerance=5):
     
     :param image_np: Image as a NumPy array.
     :param tolerance: The threshold below which pixel values are considered "black".
-    :return: Tuple (left, top, right, bottom) indicating the borders to remove.
+    :return: Tuple ((left, top, right, bottom), mask) with the borders to remove and the 2D non-black pixel mask.
     """
     height, width, _ = image_np.shape
-    
-    # Detect top border
-    top = 0
-    for row in range(height):
-        if np.any(image_np[row, :, :] > tolerance):
-            break
-        top = row + 1
-    
-    # Detect bottom border
-    bottom = height
-    for row in range(height - 1, -1, -1):
-        if np.any(image_np[row, :, :] > tolerance):
-            break
-        bottom = row
-    
-    # Detect left border
-    left = 0
-    for col in range(width):
-        if np.any(image_np[:, col, :] > tolerance):
-            break
-        left = col + 1
-    
-    # Detect right border
-    right = width
-    for col in range(width - 1, -1, -1):
-        if np.any(image_np[:, col, :] > tolerance):
-            break
-        right = col
-    
-    return left, top, right, bottom
+
+    # Collapse the channels into a single "has content" mask (brightest channel above the tolerance), then reduce it to rows and columns
+    mask = image_np.max(axis=2) > tolerance
+    row_has = mask.any(axis=1)
+    col_has = mask.any(axis=0)
+
+    # An entirely black image has no borders to remove
+    if not row_has.any():
+        return (0, 0, width, height), mask
+
+    # The first True from either end marks the edge of the content
+    top = int(np.argmax(row_has))
+    bottom = height - int(np.argmax(row_has[::-1]))
+    left = int(np.argmax(col_has))
+    right = width - int(np.argmax(col_has[::-1]))
+
+    return (left, top, right, bottom), mask
 
 def analyze_image(image_path):
     """
@@ -66,10 +67,11 @@ def analyze_image(image_path):
             original_aspect_ratio = original_width / original_height
 
             # Convert image to NumPy array for border detection
-            image_np = np.array(image)
+            image_np = np.asarray(image)  # One copy out of Pillow, with no further astype copy; detect_borders never writes to it
 
-            # Detect borders
-            left, top, right, bottom = detect_borders(image_np)
+            # Detect borders, keeping the content mask for pixel statistics
+            (left, top, right, bottom), mask = detect_borders(image_np)
+            content_ratio = float(mask.mean())
 
             # Calculate bounding box dimensions
             bbox_width = right - left
@@ -99,13 +101,14 @@ def analyze_image(image_path):
                 "bounding_box_dimensions": {"width": bbox_width, "height": bbox_height},
                 "bounding_box_aspect_ratio": round(bbox_aspect_ratio, 2),
                 "has_significant_borders": has_significant_borders,
+                "content_ratio": round(content_ratio, 4),
                 "category": category,
             }
 
             return description
 
     except Exception as e:
-        logging.error(f"Error analyzing {image_path}: {e}")
+        log.error("Error analyzing %s: %s", image_path, e)
         return None
 
 def process_directory(input_dir, output_log_path):
@@ -115,32 +118,45 @@ def process_directory(input_dir, output_log_path):
     :param input_dir: Directory containing input images.
     :param output_log_path: Path to save the analysis log.
     """
-    logging.info(f"Starting to process directory: {input_dir}")
-
-    # List to store analysis results
-    analysis_results = []
-
-    # Process each image in the directory
-    for filename in os.listdir(input_dir):
-        input_path = os.path.join(input_dir, filename)
-        if os.path.isfile(input_path) and filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            logging.info(f"Analyzing file: {filename}")
-            description = analyze_image(input_path)
-            if description:
-                analysis_results.append(description)
-        else:
-            logging.info(f"Skipping non-image file: {filename}")
+    log.info("Starting to process directory: %s", input_dir)
+
+    # Collect the images in the directory
+    with os.scandir(input_dir) as it:
+        entries = list(it)  # DirEntry caches the file type from the directory read, so is_file() needs no extra stat
+
+    image_paths = []
+    for entry in entries:
+        filename = entry.name
+        input_path = entry.path
+        if filename.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+            image_paths.append(input_path)
+        elif log.isEnabledFor(logging.DEBUG):
+            log.debug("Skipping non-image file: %s", filename)
+    log.info("Analyzing %d images.", len(image_paths))
+
+    # Analyze the images across worker processes; map keeps the results in directory order
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    listener.start()
+    try:
+        with ProcessPoolExecutor(initializer=init_worker_logging, initargs=(log_queue,)) as executor:
+            descriptions = executor.map(analyze_image, image_paths, chunksize=16)
+            analysis_results = [description for description in descriptions if description]
+    finally:
+        listener.stop()
 
     # Save analysis results to a JSON log file
     with open(output_log_path, "w") as log_file:
         json.dump(analysis_results, log_file, indent=4)
 
-    logging.info(f"Analysis complete. Results saved to: {output_log_path}")
+    log.info("Analysis complete. Results saved to: %s", output_log_path)
 
-# Input directory and output log path
-input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
-output_log_path = r"C:\Users\Sabbo\LifeDrawingGallery\analysis_log.json"
+# Guarded so worker processes can import this module without re-running the analysis
+if __name__ == "__main__":
+    # Input directory and output log path
+    input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
+    output_log_path = r"C:\Users\Sabbo\LifeDrawingGallery\analysis_log.json"
 
-# Process all images in the directory
-process_directory(input_directory, output_log_path)
-input("Processing complete. Press Enter to exit...")
\ No newline at end of file
+    # Process all images in the directory
+    process_directory(input_directory, output_log_path)
+    input("Processing complete. Press Enter to exit...")
\ No newline at end of file
@@ -1,54 +1,147 @@
 import os
+import io
 import time
 import csv
+import hashlib
+import queue
+import threading
+from collections import deque
 from PIL import Image
+import numpy as np
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg"})  # Matched against the lowercased os.path.splitext suffix
+
+# Copy a (count, height, width, 3) stack of tiles into their grid cells, one grid row per thread under Numba
+def tile_images(tiles, stitched, rows, cols, tile_height, tile_width):
+    for i in prange(rows):
+        for j in range(cols):
+            stitched[i * tile_height:(i + 1) * tile_height, j * tile_width:(j + 1) * tile_width] = tiles[i * cols + j]
+
+if njit is not None:
+    tile_images = njit(cache=True, parallel=True)(tile_images)
 
 def get_corner_pixels(image):
-    pixels = image.load()
     width, height = image.size
     return (
-        pixels[0, 0],  # Top-left
-        pixels[width - 1, 0],  # Top-right
-        pixels[0, height - 1],  # Bottom-left
-        pixels[width - 1, height - 1]  # Bottom-right
+        image.getpixel((0, 0)),  # Top-left
+        image.getpixel((width - 1, 0)),  # Top-right
+        image.getpixel((0, height - 1)),  # Bottom-left
+        image.getpixel((width - 1, height - 1))  # Bottom-right
     )
 
 def create_composite_key(filename, corners):
     return f"{filename}_{corners[0]}_{corners[1]}_{corners[2]}_{corners[3]}"
 
+# Hash the raw file bytes so exact copies can be rejected before any decoding
+def hash_contents(data):
+    if xxhash is not None:
+        return f"{xxhash.xxh3_64_intdigest(data):016x}"
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+# Returns (composite keys, content hashes); logs written before content hashes were added only fill the first set
 def load_processed_images(log_csv_path):
-    processed_images = {}
-    if os.path.exists(log_csv_path):
-        with open(log_csv_path, 'r', newline='') as file:
-            reader = csv.reader(file)
-            next(reader, None)  # Skip header
-            for row in reader:
-                composite_key = row[3]  # Composite key is the 4th column
-                batch_number = int(row[2])  # Batch number is the 3rd column
-                processed_images[composite_key] = batch_number
-    return processed_images
-
-def write_log_to_csv(log_csv_path, log_entries):
-    file_exists = os.path.exists(log_csv_path)
-    with open(log_csv_path, 'a', newline='') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Category", "Subcategory", "Batch Number", "Composite Key", "Image Filename"])
-        writer.writerows(log_entries)
-
-def process_category(input_dir, output_path, category, grid_size, image_size, processed_images, log_entries, category_summaries):
-    category_path = os.path.join(input_dir, category)
-
-    if not os.path.isdir(category_path):
-        print(f"Skipping {category} because the category directory does not exist.")
-        return category_summaries
-
-    subcategories = [subcategory for subcategory in os.listdir(category_path) if os.path.isdir(os.path.join(category_path, subcategory))]
-    
-    # Add a 'main' subcategory for images directly in the category folder
-    if not any(subcategory == 'main' for subcategory in subcategories):
-        subcategories.append('main')
-    
+    if not os.path.exists(log_csv_path):
+        return set(), set()
+    if pd is not None:
+        # Naming all six columns lets header-only logs and 5-column rows from before content hashes load; the missing hash reads as ''
+        log = pd.read_csv(log_csv_path, header=None, skiprows=1, names=range(6), dtype=str, keep_default_na=False)
+        content_hashes = set(log[5])
+        content_hashes.discard('')
+        return set(log[3]), content_hashes
+    with open(log_csv_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header
+        processed_images = set()
+        content_hashes = set()
+        for row in reader:
+            processed_images.add(row[3])  # Composite key is the 4th column
+            if len(row) > 5:
+                content_hashes.add(row[5])  # Content hash is the 6th column
+        return processed_images, content_hashes
+
+# Read files on a background thread, at most `depth` ahead of the consumer, so disk reads overlap decoding.
+# Yields (bytes, None) or (None, error) per path, in order; closing the generator stops the reader.
+def prefetch_files(paths, depth):
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def read_ahead():
+        for path in paths:
+            try:
+                with open(path, 'rb') as file:
+                    item = (file.read(), None)
+            except OSError as e:
+                item = (None, e)
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set():
+                return
+
+    threading.Thread(target=read_ahead, daemon=True).start()
+    try:
+        for _ in paths:
+            yield buffer.get()
+    finally:
+        stop.set()
+
+def write_log_to_csv(log_file, log_entries):
+    writer = csv.writer(log_file)
+    writer.writerows(log_entries)
+    log_file.flush()  # Keep the log current in case a later batch fails
+
+# Walk the input tree once, yielding (category, subcategories) for each category folder.
+# Each subcategory is (name, path, image filenames); 'main' holds the images in the category folder itself.
+def walk_categories(input_dir):
+    with os.scandir(input_dir) as entries:
+        category_entries = [entry for entry in entries if entry.is_dir()]
+
+    for category_entry in category_entries:
+        # Subfolders and the category's own images come out of the same scan
+        subcategory_entries = []
+        main_images = []
+        with os.scandir(category_entry.path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subcategory_entries.append(entry)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    main_images.append(entry.name)
+
+        subcategories = []
+        for subcategory_entry in subcategory_entries:
+            if subcategory_entry.name == 'main':
+                subcategories.append(('main', category_entry.path, main_images))
+                continue
+            with os.scandir(subcategory_entry.path) as entries:
+                images = [entry.name for entry in entries if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file()]
+            subcategories.append((subcategory_entry.name, subcategory_entry.path, images))
+
+        # Add a 'main' subcategory for images directly in the category folder
+        if not any(subcategory == 'main' for subcategory, _, _ in subcategories):
+            subcategories.append(('main', category_entry.path, main_images))
+
+        yield category_entry.name, subcategories
+
+def process_category(output_path, category, subcategories, grid_size, image_size, processed_images, content_hashes, log_file, category_summaries):
     category_summaries[category] = {
         "Images in folder": 0,
         "Checked": 0,
@@ -57,15 +150,11 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
         "Stitched batches": 0
     }
 
-    for subcategory in subcategories:
-        subcategory_path = os.path.join(category_path, subcategory)
+    for subcategory, subcategory_path, available_images in subcategories:
         # If the 'main' subcategory is the category folder itself
         if subcategory == 'main':
-            subcategory_path = category_path
             print(f"Processing images directly from {category} folder under 'main' subcategory.")
 
-        available_images = [f for f in os.listdir(subcategory_path) if os.path.isfile(os.path.join(subcategory_path, f)) and f.lower().endswith((".png", ".jpg", ".jpeg"))]
-
         if not available_images:
             print(f"No images found in {subcategory} folder. Skipping.")
             continue
@@ -79,18 +168,32 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
 
         batch_number = 1  # Track batch number incrementally
 
+        # File contents arrive in the same order as available_images, a couple of batches ahead
+        prefetched = prefetch_files([f"{subcategory_path}{os.sep}{filename}" for filename in available_images], 2 * grid_size[0] * grid_size[1])
+        available_images = deque(available_images)  # Consumed from the front one filename at a time
+
         while available_images:
             images = []
             batch_log = []
             print(f"Checking for duplicates and loading images in {subcategory_path}...")
 
             while len(images) < grid_size[0] * grid_size[1] and available_images:
-                filename = available_images.pop(0)
-                input_path = os.path.join(subcategory_path, filename)
+                filename = available_images.popleft()
+                data, read_error = next(prefetched)
                 checked_in_category += 1
 
                 try:
-                    image = Image.open(input_path)
+                    if read_error is not None:
+                        raise read_error
+                    content_hash = hash_contents(data)
+                    if content_hash in content_hashes:
+                        print(f"Duplicate image found: {filename}. It will be ignored.")
+                        duplicates_in_category += 1
+                        continue
+
+                    # Plain full-size decode and default resize: the composite key uses the resized corner pixels, and a
+                    # reduced-scale JPEG decode or reducing_gap changes them, so images already in the log would stop matching
+                    image = Image.open(io.BytesIO(data))
                     image = image.resize(image_size)
                     corners = get_corner_pixels(image)
                     composite_key = create_composite_key(filename, corners)
@@ -101,8 +204,9 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
                         continue
 
                     print(f"Processing image: {filename}")
-                    images.append(image)
-                    batch_log.append((category, subcategory, batch_number, composite_key, filename))
+                    images.append(np.asarray(image if image.mode == 'RGB' else image.convert('RGB')))  # Keep the tile as the array it is stitched from
+                    batch_log.append((category, subcategory, batch_number, composite_key, filename, content_hash))
+                    content_hashes.add(content_hash)
 
                 except Exception as e:
                     print(f"Error processing {filename}: {e}")
@@ -115,22 +219,22 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
                 break
 
             print(f"Stitching batch {batch_number}...")
-            grid_width = grid_size[1] * image_size[0]
-            grid_height = grid_size[0] * image_size[1]
-            stitched_image = Image.new('RGB', (grid_width, grid_height))
+            tile_width, tile_height = image_size
+            grid_width = grid_size[1] * tile_width
+            grid_height = grid_size[0] * tile_height
+
+            # Copy each tile straight into one preallocated RGB buffer
+            tiles = np.stack(images)
+            stitched = np.empty((grid_height, grid_width, 3), dtype=np.uint8)
+            tile_images(tiles, stitched, grid_size[0], grid_size[1], tile_height, tile_width)
 
-            for i in range(grid_size[0]):
-                for j in range(grid_size[1]):
-                    index = i * grid_size[1] + j
-                    x_offset = j * image_size[0]
-                    y_offset = i * image_size[1]
-                    stitched_image.paste(images[index], (x_offset, y_offset))
+            stitched_image = Image.fromarray(stitched)
 
             # Updated filename format
             stitched_image_name = f"{category}-{subcategory}-{batch_number}.png"
-            stitched_image.save(os.path.join(output_path, stitched_image_name))
+            stitched_image.save(os.path.join(output_path, stitched_image_name), optimize=False, compress_level=1)  # Favour save speed over file size
 
-            log_entries.extend(batch_log)
+            write_log_to_csv(log_file, batch_log)
             category_summaries[category]["Stitched batches"] += 1
             processed_in_category += len(images)
             stitched_in_category += 1
@@ -138,6 +242,8 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
 
             print(f"Batch {batch_number - 1} stitched and saved as {stitched_image_name}.")
 
+        prefetched.close()
+
         category_summaries[category][subcategory] = {
             "Images in folder": len(available_images),
             "Checked": checked_in_category,
@@ -153,16 +259,17 @@ def stitch_images(input_dir, output_path, log_csv_path, grid_size=(4, 4), image_
         duplicate_count = 0
         batch_count = 0
         duplicate_files = []
-        processed_images = load_processed_images(log_csv_path)
-        log_entries = []
+        processed_images, content_hashes = load_processed_images(log_csv_path)
         category_summaries = {}
 
-        categories = [category for category in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, category))]
-
-        for category in categories:
-            category_summaries = process_category(input_dir, output_path, category, grid_size, image_size, processed_images, log_entries, category_summaries)
+        # Batches are appended to the log as soon as they are stitched
+        file_exists = os.path.exists(log_csv_path)
+        with open(log_csv_path, 'a', newline='') as log_file:
+            if not file_exists:
+                csv.writer(log_file).writerow(["Category", "Subcategory", "Batch Number", "Composite Key", "Image Filename", "Content Hash"])
 
-        write_log_to_csv(log_csv_path, log_entries)
+            for category, subcategories in walk_categories(input_dir):
+                category_summaries = process_category(output_path, category, subcategories, grid_size, image_size, processed_images, content_hashes, log_file, category_summaries)
 
         # Summary
         print("\nSummary Report")
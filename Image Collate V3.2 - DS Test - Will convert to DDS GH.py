@@ -1,13 +1,25 @@
 import os
 import csv
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from PIL import Image, ImageOps, ImageEnhance
-import imagehash
 import numpy as np
-from collections import defaultdict
+from collections import defaultdict, deque, namedtuple
 import imageio  # For DDS conversion
 
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import cv2  # OpenCV's area resize is several times faster than Pillow's on large photos
+except ImportError:
+    cv2 = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -18,32 +30,89 @@ logging.basicConfig(
     ]
 )
 
-def get_perceptual_hash(image):
-    """Generate a perceptual hash of the image using phash."""
-    return imagehash.phash(image)
-
-def get_dominant_color(image):
-    """Calculate the average color of the image."""
-    image = image.resize((50, 50))  # Resize to speed up calculation
-    pixels = np.array(image)
-    avg_color = np.mean(pixels, axis=(0, 1))  # Average RGB values
-    return tuple(avg_color)
-
-def calculate_whiteness(image, threshold=240):
-    """Calculate the proportion of white pixels in the image."""
-    pixels = np.array(image)
-    white_pixels = np.sum(np.all(pixels >= threshold, axis=-1))  # Count white pixels
-    total_pixels = pixels.shape[0] * pixels.shape[1]
-    whiteness_ratio = white_pixels / total_pixels
-    return whiteness_ratio
-
-def calculate_blackness(image, threshold=30):
-    """Calculate the proportion of black pixels in the image."""
-    pixels = np.array(image)
-    black_pixels = np.sum(np.all(pixels <= threshold, axis=-1))  # Count black pixels
-    total_pixels = pixels.shape[0] * pixels.shape[1]
-    blackness_ratio = black_pixels / total_pixels
-    return blackness_ratio
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg"})  # Matched against the lowercased os.path.splitext suffix
+
+# Compact per-image record returned by the fingerprinting workers
+Fingerprint = namedtuple("Fingerprint", ["filename", "perceptual_hash", "whiteness", "blackness", "dominant_color", "cache_path"])
+
+class PerceptualHashIndex:
+    """Store of 64-bit perceptual hashes where anything within max_distance bits counts as a match."""
+
+    def __init__(self, max_distance=5, capacity=1024):
+        self.max_distance = max_distance
+        self.hashes = np.empty(capacity, dtype=np.uint64)
+        self.count = 0
+        self.exact = set()  # Plain ints, so re-runs over the same images skip the distance scan
+
+    def add(self, perceptual_hash):
+        """Record a hash, doubling the backing array when it is full."""
+        if self.count == len(self.hashes):
+            self.hashes = np.concatenate([self.hashes, np.empty_like(self.hashes)])
+        self.hashes[self.count] = perceptual_hash
+        self.count += 1
+        self.exact.add(perceptual_hash)
+
+    def update(self, perceptual_hashes):
+        """Record many hashes at once, growing the backing array a single time."""
+        perceptual_hashes = np.asarray(perceptual_hashes, dtype=np.uint64)
+        needed = self.count + len(perceptual_hashes)
+        if needed > len(self.hashes):
+            grown = np.empty(max(needed, 2 * len(self.hashes)), dtype=np.uint64)
+            grown[:self.count] = self.hashes[:self.count]
+            self.hashes = grown
+        self.hashes[self.count:needed] = perceptual_hashes
+        self.count = needed
+        self.exact.update(perceptual_hashes.tolist())
+
+    def __contains__(self, perceptual_hash):
+        """Compare against every stored hash at once using XOR and a bit count."""
+        if perceptual_hash in self.exact:
+            return True
+        if not self.count:
+            return False
+        differing_bits = self.hashes[:self.count] ^ np.uint64(perceptual_hash)
+        if hasattr(np, 'bitwise_count'):
+            distances = np.bitwise_count(differing_bits)  # NumPy 2.0+ maps this to the CPU's popcount instruction
+        else:
+            distances = np.unpackbits(differing_bits.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+        return distances.min() <= self.max_distance
+
+    def __len__(self):
+        return self.count
+
+def dct_basis(hash_size, size):
+    """First hash_size rows of the unnormalized DCT-II matrix (scipy's default) for a length-size signal."""
+    k = np.arange(hash_size)[:, None]
+    n = np.arange(size)[None, :]
+    return 2 * np.cos(np.pi * k * (2 * n + 1) / (2 * size))
+
+PHASH_BASIS = dct_basis(8, 32)
+
+def get_perceptual_hash(pixels, hash_size=8, highfreq_factor=4):
+    """
+    Generate a 64-bit perceptual hash of an RGB array, packed into an int.
+    Same algorithm and bit order as imagehash.phash, but the 32x32 grayscale thumbnail comes straight from the array
+    and only the low-frequency corner of the DCT is computed, as two small matrix products.
+    """
+    thumbnail_size = hash_size * highfreq_factor
+    basis = PHASH_BASIS if PHASH_BASIS.shape == (hash_size, thumbnail_size) else dct_basis(hash_size, thumbnail_size)
+    if cv2 is not None:
+        gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+        thumbnail = cv2.resize(gray, (thumbnail_size, thumbnail_size), interpolation=cv2.INTER_AREA)
+    else:
+        thumbnail = np.asarray(Image.fromarray(pixels).convert('L').resize((thumbnail_size, thumbnail_size), Image.LANCZOS))
+    low_frequencies = basis @ thumbnail.astype(np.float64) @ basis.T
+    bits = low_frequencies > np.median(low_frequencies)
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def analyze_colors(pixels, white_threshold=240, black_threshold=30):
+    """Calculate the proportion of white and black pixels and the average color of an RGB uint8 array in one pass."""
+    channel_min = pixels.min(axis=-1)  # A pixel is white when its darkest channel is above the threshold
+    channel_max = pixels.max(axis=-1)  # A pixel is black when its brightest channel is below the threshold
+    whiteness = np.count_nonzero(channel_min >= white_threshold) / channel_min.size
+    blackness = np.count_nonzero(channel_max <= black_threshold) / channel_max.size
+    avg_color = pixels.mean(axis=(0, 1))  # Average RGB values
+    return whiteness, blackness, tuple(avg_color)
 
 def preprocess_image(image):
     """Apply preprocessing steps like normalization and histogram equalization."""
@@ -54,90 +123,156 @@ def preprocess_image(image):
     image = enhancer.enhance(1.5)
     return image
 
-def process_image(filename, subcategory_path, image_size, processed_images):
-    """Process a single image and return its data or log errors."""
-    input_path = os.path.join(subcategory_path, filename)
+def load_resized_pixels(input_path, image_size):
+    """Decode and resize an image to an RGB uint8 array, using OpenCV when it is installed."""
+    if cv2 is not None:
+        pixels = cv2.imread(input_path, cv2.IMREAD_COLOR)
+        if pixels is None:
+            raise ValueError(f"OpenCV could not read {input_path}")
+        pixels = cv2.resize(pixels, image_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+    with Image.open(input_path) as image:
+        if image.format == 'JPEG':
+            image.draft('RGB', image_size)  # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying above the target size
+        image = image.resize(image_size, reducing_gap=2.0)  # Box-reduce by an integer factor first, then resample the remainder
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+def process_image(index, filename, subcategory_path, image_size, cache_dir):
+    """
+    Fingerprint a single image, returning a small picklable record or None on error.
+    The resized pixels are cached as a .npy file so the main process never decodes the source again.
+    """
+    input_path = f"{subcategory_path}{os.sep}{filename}"  # subcategory_path comes from a DirEntry, so it never ends in a separator
     try:
-        image = Image.open(input_path)
-        image = image.resize(image_size)
-        image = preprocess_image(image)  # Apply preprocessing
-        dominant_color = get_dominant_color(image)
-        whiteness = calculate_whiteness(image)
-        blackness = calculate_blackness(image)
-        perceptual_hash = get_perceptual_hash(image)
-        if perceptual_hash in processed_images:
-            logging.warning(f"Duplicate image found: {filename}")
-            return None, filename, True  # Return None for image, filename, and duplicate flag
-        return (image, dominant_color, whiteness, blackness, filename), filename, False
+        pixels = load_resized_pixels(input_path, image_size)
+        whiteness, blackness, dominant_color = analyze_colors(pixels)
+        perceptual_hash = get_perceptual_hash(pixels)
+        cache_path = os.path.join(cache_dir, f"{index}.npy")
+        np.save(cache_path, pixels)
+        return Fingerprint(filename, perceptual_hash, whiteness, blackness, dominant_color, cache_path)
     except Exception as e:
         logging.error(f"Error processing {filename}: {e}")
-        return None, filename, False
-
-def process_images_in_parallel(available_images, subcategory_path, image_size, processed_images):
-    """Process images in parallel using ThreadPoolExecutor."""
-    images = []
-    duplicates = []
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(process_image, filename, subcategory_path, image_size, processed_images) for filename in available_images]
-        for future in as_completed(futures):
-            result, filename, is_duplicate = future.result()
-            if is_duplicate:
-                duplicates.append(filename)
-            elif result:
-                images.append(result)
-    return images, duplicates
+        return None
+
+def process_images_in_parallel(executor, available_images, subcategory_path, image_size, cache_dir, lookahead):
+    """
+    Queue images for fingerprinting on the worker pool, returning an iterator over their records in input order.
+    At most `lookahead` images are queued or waiting ahead of the consumer, so the .npy cache stays a fixed size however large the folder.
+    Workers never see processed_images; the main process checks and extends it as records arrive, so nothing is shared or merged.
+    """
+    tasks = enumerate(available_images)
+    pending = deque(
+        executor.submit(process_image, index, filename, subcategory_path, image_size, cache_dir)
+        for index, filename in islice(tasks, lookahead)
+    )
+
+    def results():
+        while pending:
+            fingerprint = pending.popleft().result()
+            for index, filename in islice(tasks, 1):  # Top the queue back up by one as each record is taken
+                pending.append(executor.submit(process_image, index, filename, subcategory_path, image_size, cache_dir))
+            yield fingerprint
+
+    return results()
+
+def submit_category(executor, subcategories, image_size, cache_dir, lookahead):
+    """
+    Queue fingerprinting for the first images of every subcategory of a category without waiting for it.
+    Returns (subcategory, path, image filenames, cache directory, fingerprint iterator) for each subcategory.
+    """
+    submitted = []
+    for subcategory, subcategory_path, available_images in subcategories:
+        if not available_images:
+            submitted.append((subcategory, subcategory_path, available_images, None, iter(())))
+            continue
+        subcategory_cache = tempfile.mkdtemp(dir=cache_dir)
+        fingerprints = process_images_in_parallel(executor, available_images, subcategory_path, image_size, subcategory_cache, lookahead)
+        submitted.append((subcategory, subcategory_path, available_images, subcategory_cache, fingerprints))
+    return submitted
 
 def load_processed_images(log_csv_path):
-    """Load previously processed images and their hashes from a CSV log."""
-    processed_images = {}
-    if os.path.exists(log_csv_path):
-        with open(log_csv_path, 'r', newline='') as file:
-            reader = csv.reader(file)
-            next(reader, None)  # Skip header
-            for row in reader:
-                perceptual_hash = row[3]  # Perceptual hash is the 4th column
-                batch_number = int(row[2])  # Batch number is the 3rd column
-                processed_images[perceptual_hash] = batch_number
+    """Load previously processed image hashes from a CSV log."""
+    processed_images = PerceptualHashIndex()
+    if not os.path.exists(log_csv_path):
+        return processed_images
+    if pd is not None:
+        # pandas' C parser only materializes the perceptual hash column; naming the columns lets a header-only log load as empty
+        log = pd.read_csv(log_csv_path, header=None, skiprows=1, names=range(5), usecols=[3], dtype=str, keep_default_na=False)
+        processed_images.update([int(perceptual_hash, 16) for perceptual_hash in log[3]])
+        return processed_images
+    with open(log_csv_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Skip header
+        processed_images.update([int(row[3], 16) for row in reader])  # Perceptual hash is the 4th column, stored as hex
     return processed_images
 
-def write_log_to_csv(log_csv_path, log_entries):
-    """Write the log entries to the CSV file."""
-    file_exists = os.path.exists(log_csv_path)
-    with open(log_csv_path, 'a', newline='') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Category", "Subcategory", "Batch Number", "Perceptual Hash", "Image Filename"])
-        writer.writerows(log_entries)
+def open_log_writer(log_csv_path):
+    """Open the CSV log for appending, writing the header if the file is new. Returns (file, writer, is_new)."""
+    is_new = not os.path.exists(log_csv_path)
+    file = open(log_csv_path, 'a', newline='')
+    writer = csv.writer(file)
+    if is_new:
+        writer.writerow(["Category", "Subcategory", "Batch Number", "Perceptual Hash", "Image Filename"])
+    return file, writer, is_new
 
 def group_images_by_blackness_whiteness_and_color(images):
     """
     Group images by their blackness (darker images at the bottom),
     then whiteness (lighter images at the top), and finally by dominant color similarity.
     """
-    # Sort by blackness (descending), then whiteness (ascending), then dominant color similarity
-    images.sort(key=lambda x: (-x[3], x[2], np.linalg.norm(np.array(x[1]) - np.array([128, 128, 128]))))
+    # Sort by blackness (descending), then whiteness (ascending), then dominant color similarity.
+    # The squared distance from mid-grey is precomputed, so the key is just a tuple of floats.
+    images.sort(key=lambda x: (-x[3], x[2], x[5]))
     return images
 
-def convert_to_dds(image_path, output_path):
-    """Convert an image to DDS format using imageio."""
+def convert_to_dds(pixels, output_path):
+    """Write an in-memory image array to DDS format using imageio. Returns True if the file was written."""
     try:
-        image = imageio.imread(image_path)
-        imageio.imwrite(output_path, image, format="DDS")
-        logging.info(f"Converted {image_path} to {output_path}")
+        imageio.imwrite(output_path, pixels, format="DDS")
+        logging.info(f"Wrote {output_path}")
+        return True
     except Exception as e:
-        logging.error(f"Error converting {image_path} to DDS: {e}")
+        logging.error(f"Error writing {output_path} as DDS: {e}")
+        return False
 
-def process_category(input_dir, output_path, category, grid_size, image_size, processed_images, log_entries, category_summaries):
-    """Process all images in a category."""
-    category_path = os.path.join(input_dir, category)
-    if not os.path.isdir(category_path):
-        logging.warning(f"Skipping {category} because the category directory does not exist.")
-        return category_summaries
+def walk_categories(input_dir):
+    """
+    Walk the input tree once, yielding (category, subcategories) for each category folder.
+    Each subcategory is (name, path, image filenames); 'main' holds the images in the category folder itself.
+    """
+    with os.scandir(input_dir) as entries:
+        category_entries = [entry for entry in entries if entry.is_dir()]
+
+    for category_entry in category_entries:
+        # Subfolders and the category's own images come out of the same scan
+        subcategory_entries = []
+        main_images = []
+        with os.scandir(category_entry.path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subcategory_entries.append(entry)
+                elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    main_images.append(entry.name)
+
+        subcategories = []
+        for subcategory_entry in subcategory_entries:
+            if subcategory_entry.name == 'main':
+                subcategories.append(('main', category_entry.path, main_images))
+                continue
+            with os.scandir(subcategory_entry.path) as entries:
+                images = [entry.name for entry in entries if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS and entry.is_file()]
+            subcategories.append((subcategory_entry.name, subcategory_entry.path, images))
+
+        # Add a 'main' subcategory for images directly in the category folder
+        if not any(subcategory == 'main' for subcategory, _, _ in subcategories):
+            subcategories.append(('main', category_entry.path, main_images))
 
-    subcategories = [subcategory for subcategory in os.listdir(category_path) if os.path.isdir(os.path.join(category_path, subcategory))]
-    if not any(subcategory == 'main' for subcategory in subcategories):
-        subcategories.append('main')
+        yield category_entry.name, subcategories
 
+def process_category(output_path, category, subcategories, grid_size, image_size, processed_images, log_file, log_writer, category_summaries, save_png=False):
+    """Process all images in a category."""
     # Initialize category summary counters
     category_summaries[category] = {
         "Images in folder": 0,
@@ -148,14 +283,10 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
         "Duplicate files": []  # Track duplicate filenames
     }
 
-    for subcategory in subcategories:
-        subcategory_path = os.path.join(category_path, subcategory)
+    for subcategory, subcategory_path, available_images, subcategory_cache, fingerprints in subcategories:
         if subcategory == 'main':
-            subcategory_path = category_path
             logging.info(f"Processing images directly from {category} folder under 'main' subcategory.")
 
-        available_images = [f for f in os.listdir(subcategory_path) if os.path.isfile(os.path.join(subcategory_path, f)) and f.lower().endswith((".png", ".jpg", ".jpeg"))]
-
         if not available_images:
             logging.warning(f"No images found in {subcategory} folder. Skipping.")
             continue
@@ -168,41 +299,48 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
         stitched_in_category = 0
 
         batch_number = 1  # Track batch number incrementally
-        all_images = []  # This will store images as (image, dominant_color, whiteness, blackness, filename)
 
-        while available_images:
+        # Fingerprints arrive from the pool as they are consumed; batching below only loads the cached pixels of images it keeps
+        logging.info(f"Fingerprinting {len(available_images)} images in {subcategory_path}...")
+        exhausted = False
+
+        while not exhausted:
             batch_log = []
+            batch_hashes = PerceptualHashIndex(capacity=grid_size[0] * grid_size[1])  # Only recorded as processed once the batch is written
             logging.info(f"Checking for duplicates and loading images in {subcategory_path}...")
 
-            images = []
-            while len(images) < grid_size[0] * grid_size[1] and available_images:
-                filename = available_images.pop(0)
-                input_path = os.path.join(subcategory_path, filename)
+            images = []  # Stored as (pixels, dominant_color, whiteness, blackness, filename, squared distance from mid-grey)
+            while len(images) < grid_size[0] * grid_size[1]:
+                fingerprint = next(fingerprints, False)  # None is a failed image, so False marks the end
+                if fingerprint is False:
+                    exhausted = True
+                    break
                 checked_in_category += 1
+                if fingerprint is None:
+                    continue  # The worker already logged the error
 
-                try:
-                    image = Image.open(input_path)
-                    image = image.resize(image_size)
-                    dominant_color = get_dominant_color(image)
-                    whiteness = calculate_whiteness(image)
-                    blackness = calculate_blackness(image)
-
-                    # Check if perceptual hash is already in processed_images (i.e., duplicate detection)
-                    perceptual_hash = get_perceptual_hash(image)
-                    if perceptual_hash in processed_images:
-                        logging.warning(f"Duplicate image found: {filename}. It will be ignored.")
-                        duplicates_in_category += 1
-                        category_summaries[category]["Duplicate files"].append(filename)  # Add to duplicate list
-                        continue
-
-                    images.append((image, dominant_color, whiteness, blackness, filename))  # Store image with its dominant color, whiteness, blackness
-                    batch_log.append((category, subcategory, batch_number, str(perceptual_hash), filename))
-
-                    # Add the perceptual hash to the processed images tracker
-                    processed_images[perceptual_hash] = batch_number
+                filename = fingerprint.filename
+                perceptual_hash = fingerprint.perceptual_hash
 
+                # Check if a near-identical perceptual hash is already processed or in this batch (i.e., duplicate detection)
+                if perceptual_hash in processed_images or perceptual_hash in batch_hashes:
+                    logging.warning(f"Duplicate image found: {filename}. It will be ignored.")
+                    duplicates_in_category += 1
+                    category_summaries[category]["Duplicate files"].append(filename)  # Add to duplicate list
+                    os.remove(fingerprint.cache_path)  # Each cached file is read at most once, so drop it as soon as it is handled
+                    continue
+
+                try:
+                    pixels = np.load(fingerprint.cache_path)
+                    os.remove(fingerprint.cache_path)
                 except Exception as e:
                     logging.error(f"Error processing {filename}: {e}")
+                    continue
+
+                color_distance = sum((channel - 128) ** 2 for channel in fingerprint.dominant_color)  # Same order as the Euclidean norm, without the square root
+                images.append((pixels, fingerprint.dominant_color, fingerprint.whiteness, fingerprint.blackness, filename, color_distance))  # Store the resized pixels with their dominant color, whiteness, blackness
+                batch_log.append((category, subcategory, batch_number, f"{perceptual_hash:016x}", filename))
+                batch_hashes.add(perceptual_hash)
 
             if not images:
                 break
@@ -219,27 +357,37 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
             logging.info(f"Stitching batch {batch_number}...")
 
             # Only increment the batch number if there are enough images to form a full batch
-            grid_width = grid_size[1] * image_size[0]
-            grid_height = grid_size[0] * image_size[1]
-            stitched_image = Image.new('RGB', (grid_width, grid_height))
+            tile_width, tile_height = image_size
+            grid_width = grid_size[1] * tile_width
+            grid_height = grid_size[0] * tile_height
+            stitched = np.empty((grid_height, grid_width, 3), dtype=np.uint8)  # Every cell is overwritten below
 
-            for j, (img, _, _, _, _) in enumerate(images[:grid_size[0] * grid_size[1]]):  # Only take as many as the grid can hold
+            for j, (pixels, _, _, _, _, _) in enumerate(images[:grid_size[0] * grid_size[1]]):  # Only take as many as the grid can hold
                 row, col = divmod(j, grid_size[1])
-                x_offset = col * image_size[0]
-                y_offset = row * image_size[1]
-                stitched_image.paste(img, (x_offset, y_offset))
-
-            # Save the stitched image as PNG
-            stitched_image_name = f"{category}-{subcategory}-{batch_number}.png"
-            stitched_image_path = os.path.join(output_path, stitched_image_name)
-            stitched_image.save(stitched_image_path)
-
-            # Convert the stitched image to DDS
+                y_offset = row * tile_height
+                x_offset = col * tile_width
+                stitched[y_offset:y_offset + tile_height, x_offset:x_offset + tile_width] = pixels
+
+            # The DDS is the file that ships; the PNG is only an optional preview, saved with light compression
+            saved_names = []
+            if save_png:
+                stitched_image_name = f"{category}-{subcategory}-{batch_number}.png"
+                stitched_image_path = os.path.join(output_path, stitched_image_name)
+                Image.fromarray(stitched).save(stitched_image_path, format='PNG', optimize=False, compress_level=1)
+                saved_names.append(stitched_image_name)
+
+            # Write the DDS straight from the stitched buffer. If it fails, the batch is not logged or recorded,
+            # so its images are not treated as duplicates on the next run.
             dds_image_name = f"{category}-{subcategory}-{batch_number}.dds"
             dds_image_path = os.path.join(output_path, dds_image_name)
-            convert_to_dds(stitched_image_path, dds_image_path)
+            if not convert_to_dds(stitched, dds_image_path):
+                continue
+            saved_names.append(dds_image_name)
 
-            log_entries.extend(batch_log)
+            # Log the batch as soon as it is saved so a crash later in the run doesn't lose it
+            log_writer.writerows(batch_log)
+            log_file.flush()
+            processed_images.update(batch_hashes.hashes[:len(batch_hashes)])
             category_summaries[category]["Stitched batches"] += 1
             processed_in_category += len(images)
             stitched_in_category += 1
@@ -247,7 +395,9 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
             # Now increment batch number after successful stitching
             batch_number += 1  # Increment batch number only after stitching
 
-            logging.info(f"Batch {batch_number - 1} stitched and saved as {stitched_image_name} and {dds_image_name}.")
+            logging.info(f"Batch {batch_number - 1} stitched and saved as {' and '.join(saved_names)}.")
+
+        shutil.rmtree(subcategory_cache, ignore_errors=True)
 
         # Update category summary with subcategory-specific counts
         category_summaries[category]["Checked"] += checked_in_category
@@ -265,19 +415,27 @@ def process_category(input_dir, output_path, category, grid_size, image_size, pr
 
     return category_summaries
 
-def stitch_images(input_dir, output_path, log_csv_path, grid_size=(4, 4), image_size=(512, 512)):
+def stitch_images(input_dir, output_path, log_csv_path, grid_size=(4, 4), image_size=(512, 512), save_png=False):
     """Main function to stitch images."""
     try:
         processed_images = load_processed_images(log_csv_path)
-        log_entries = []
+        log_file, log_writer, _ = open_log_writer(log_csv_path)
         category_summaries = {}
 
-        categories = [category for category in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, category))]
-
-        for category in categories:
-            category_summaries = process_category(input_dir, output_path, category, grid_size, image_size, processed_images, log_entries, category_summaries)
-
-        write_log_to_csv(log_csv_path, log_entries)
+        # One worker pool for the whole run, leaving a core free. The next category is fingerprinted while the current
+        # one is deduplicated and stitched here, so duplicate checks still see every image in walk order.
+        # Resized pixels from the workers are cached in cache_dir until they are read, a couple of batches ahead per subcategory.
+        max_workers = max(1, (os.cpu_count() or 2) - 1)
+        lookahead = max(2 * grid_size[0] * grid_size[1], max_workers)
+        with log_file, tempfile.TemporaryDirectory(prefix="stitch_cache_") as cache_dir, ProcessPoolExecutor(max_workers=max_workers) as executor:
+            pending = None
+            for category, subcategories in walk_categories(input_dir):
+                submitted = (category, submit_category(executor, subcategories, image_size, cache_dir, lookahead))
+                if pending:
+                    category_summaries = process_category(output_path, *pending, grid_size, image_size, processed_images, log_file, log_writer, category_summaries, save_png)
+                pending = submitted
+            if pending:
+                category_summaries = process_category(output_path, *pending, grid_size, image_size, processed_images, log_file, log_writer, category_summaries, save_png)
 
         # Summary
         logging.info("\nSummary Report")
@@ -19,37 +19,50 @@ def debug_image(image_path):
             image = image.convert('RGB')
         
         # Convert to numpy array for easier manipulation
-        image_np = np.array(image)
+        image_np = np.asarray(image)  # One copy out of Pillow, with no further astype copy; nothing below writes to it
         
         # Print basic image properties
         print(f"Image size: {image.size}")
         print(f"Image mode: {image.mode}")
         print(f"Image shape: {image_np.shape}")
         
-        # Check the unique values in the image (to see the variety of pixel values)
-        unique_values = np.unique(image_np.reshape(-1, image_np.shape[2]), axis=0)
-        print(f"Unique pixel values in image (first 10): {unique_values[:10]}")
+        # Check the unique values on a random sample of pixels (sorting every pixel is slow on large images)
+        pixels = image_np.reshape(-1, image_np.shape[2] if image_np.ndim == 3 else 1)
+        if len(pixels) > 10000:
+            pixels = pixels[np.random.default_rng().choice(len(pixels), 10000, replace=False)]
+        unique_values = np.unique(pixels, axis=0)
+        print(f"Unique pixel values in a sample of {len(pixels)} pixels (first 10): {unique_values[:10]}")
         
         # Check the shape of the mask for non-black pixels
-        mask = np.any(image_np != [0, 0, 0], axis=-1) if len(image_np.shape) == 3 else (image_np != 0)
+        mask = image_np.max(axis=2) > 0 if image_np.ndim == 3 else (image_np != 0)
         print(f"Mask shape: {mask.shape}")
         
-        # Display the coordinates of non-black pixels
-        coords = np.argwhere(mask)
-        if coords.size > 0:
-            print(f"Found non-black pixels at the following coordinates (first 10): {coords[:10]}")
+        # Rows and columns that contain any non-black pixel
+        row_has = mask.any(axis=1)
+        col_has = mask.any(axis=0)
+        
+        # Display the (row, column) coordinates of the first non-black pixels, scanning only the rows that have any
+        coords = []
+        for row in np.flatnonzero(row_has):
+            coords.extend((int(row), int(col)) for col in np.flatnonzero(mask[row])[:10 - len(coords)])
+            if len(coords) >= 10:
+                break
+        if coords:
+            print(f"Found non-black pixels at the following coordinates (first 10): {coords}")
         else:
             print("No non-black pixels found.")
         
         # If there are non-black pixels, calculate the bounding box and aspect ratio
-        if coords.size > 0:
-            x0, y0 = coords.min(axis=0)
-            x1, y1 = coords.max(axis=0) + 1  # +1 to include the last row/column
-            print(f"Calculated bounding box: Top-left({x0}, {y0}), Bottom-right({x1}, {y1})")
+        if coords:
+            top = int(np.argmax(row_has))
+            bottom = len(row_has) - int(np.argmax(row_has[::-1]))  # Exclusive, like the +1 on the last row/column
+            left = int(np.argmax(col_has))
+            right = len(col_has) - int(np.argmax(col_has[::-1]))
+            print(f"Calculated bounding box: Top-left({left}, {top}), Bottom-right({right}, {bottom})")
             
             # Calculate the aspect ratio of the bounding box
-            bbox_width = y1 - y0
-            bbox_height = x1 - x0
+            bbox_width = right - left
+            bbox_height = bottom - top
             aspect_ratio = bbox_width / bbox_height if bbox_height != 0 else 0
             print(f"Bounding box aspect ratio: {aspect_ratio:.2f} (Width/Height)")
             
@@ -57,7 +70,7 @@ def debug_image(image_path):
             debug_image = image.copy()
             from PIL import ImageDraw
             draw = ImageDraw.Draw(debug_image)
-            draw.rectangle([y0, x0, y1, x1], outline="red", width=3)
+            draw.rectangle([left, top, right, bottom], outline="red", width=3)
             debug_image.show()
 
     except Exception as e:
@@ -69,9 +82,13 @@ def debug_directory(input_dir):
     """
     print(f"Starting to debug images in directory: {input_dir}")
 
-    for filename in os.listdir(input_dir):
-        input_path = os.path.join(input_dir, filename)
-        if os.path.isfile(input_path) and filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+    with os.scandir(input_dir) as it:
+        entries = list(it)
+
+    for entry in entries:
+        filename = entry.name
+        input_path = entry.path
+        if entry.is_file() and filename.lower().endswith(('.png', '.jpg', '.jpeg')):
             debug_image(input_path)
 
 # Directory containing the images
@@ -1,50 +1,107 @@
 import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PIL import Image
 import numpy as np
-import logging
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+# Walk in from each edge and stop at the first pixel with any channel above the tolerance, so thin borders
+# only cost a few rows and columns. Returns (left, top, right, bottom), or all -1 if nothing is above it.
+def scan_content_bbox(pixels, tolerance):
+    height, width = pixels.shape[0], pixels.shape[1]
+
+    top = -1
+    for y in range(height):
+        for x in range(width):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                top = y
+                break
+        if top >= 0:
+            break
+    if top < 0:
+        return -1, -1, -1, -1
+
+    bottom = top + 1
+    for y in range(height - 1, top, -1):
+        for x in range(width):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                bottom = y + 1
+                break
+        if bottom > top + 1:
+            break
 
-def detect_borders(image_np, tolerance=5):
+    # The columns only need checking between the top and bottom content rows
+    left = -1
+    for x in range(width):
+        for y in range(top, bottom):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                left = x
+                break
+        if left >= 0:
+            break
+
+    right = left + 1
+    for x in range(width - 1, left, -1):
+        for y in range(top, bottom):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                right = x + 1
+                break
+        if right > left + 1:
+            break
+
+    return left, top, right, bottom
+
+if njit is not None:
+    scan_content_bbox = njit(cache=True)(scan_content_bbox)
+
+def find_content_bbox(image, tolerance=5):
+    """
+    Finds the bounding box of pixels where any band is above the tolerance.
+    
+    :param image: PIL Image object in RGB mode.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    :return: Tuple (left, top, right, bottom), or None if the image has no non-black content.
+    """
+    # Borderless images are common: if all four corners are content, the box is the whole frame and no scan is needed
+    width, height = image.size
+    corners = (image.getpixel((0, 0)), image.getpixel((width - 1, 0)), image.getpixel((0, height - 1)), image.getpixel((width - 1, height - 1)))
+    if all(max(corner) > tolerance for corner in corners):
+        return 0, 0, width, height
+
+    # With Numba, scan the pixels directly; the array copy is a plain memcpy and the scan stops at the content edges
+    if njit is not None:
+        left, top, right, bottom = scan_content_bbox(np.asarray(image), tolerance)
+        return None if top < 0 else (left, top, right, bottom)
+
+    # Threshold every band, then getbbox() returns the box of pixels where any band is non-zero
+    threshold_lut = [255 if value > tolerance else 0 for value in range(256)] * len(image.getbands())
+    return image.point(threshold_lut).getbbox()
+
+def detect_borders(image, tolerance=5):
     """
     Detects consistent black borders around the edges of the image.
     
-    :param image_np: Image as a NumPy array.
+    :param image: PIL Image object in RGB mode.
     :param tolerance: The threshold below which pixel values are considered "black".
     :return: Tuple (left, top, right, bottom) indicating the borders to remove.
     """
-    height, width, _ = image_np.shape
-    
-    # Detect top border
-    top = 0
-    for row in range(height):
-        if np.any(image_np[row, :, :] > tolerance):
-            break
-        top = row + 1
-    
-    # Detect bottom border
-    bottom = height
-    for row in range(height - 1, -1, -1):
-        if np.any(image_np[row, :, :] > tolerance):
-            break
-        bottom = row
-    
-    # Detect left border
-    left = 0
-    for col in range(width):
-        if np.any(image_np[:, col, :] > tolerance):
-            break
-        left = col + 1
-    
-    # Detect right border
-    right = width
-    for col in range(width - 1, -1, -1):
-        if np.any(image_np[:, col, :] > tolerance):
-            break
-        right = col
-    
-    return left, top, right, bottom
+    bbox = find_content_bbox(image, tolerance)
+
+    # An entirely black image has no borders to remove
+    if bbox is None:
+        return 0, 0, image.width, image.height
+
+    return bbox
 
 def categorize_image(cropped_image):
     """
@@ -56,9 +113,6 @@ def categorize_image(cropped_image):
     width, height = cropped_image.size
     aspect_ratio = width / height
 
-    # Debugging: Log the aspect ratio
-    logging.info(f"Aspect ratio: {aspect_ratio:.2f}")
-
     # Define aspect ratio categories and their midpoints
     categories = {
         "extra_tall": 0.6,  # Midpoint between 0.5 and 0.7
@@ -70,60 +124,97 @@ def categorize_image(cropped_image):
 
     # Find the nearest category based on the aspect ratio
     nearest_category = min(categories.keys(), key=lambda x: abs(aspect_ratio - categories[x]))
-    logging.info(f"Image categorized as: {nearest_category}")
+
+    # Debugging: log the aspect ratio; the arguments are only formatted when DEBUG is enabled
+    log.debug("Aspect ratio: %.2f, categorized as: %s", aspect_ratio, nearest_category)
     return nearest_category
 
-def remove_black_borders_and_categorize(image_path, output_path, tolerance=5):
+def crop_and_categorize(image_path, tolerance=5):
+    """
+    Removes consistent black borders from an image and categorizes it based on its aspect ratio.
+    The category comes from the image already open here, so the file is only opened once.
+    
+    :param image_path: Path to the input image.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    :return: Tuple (cropped_image, category); the image is fully loaded, so it stays usable after the file is closed.
+    """
+    # Open the image using a with statement to ensure the file handle is closed
+    with Image.open(image_path) as image:
+        # Convert RGBA, palette and grayscale images to RGB
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Detect consistent borders; this also forces the decode
+        left, top, right, bottom = detect_borders(image, tolerance)
+        
+        # Check if the borders are significant
+        img_width, img_height = image.size
+        border_threshold = 0.05  # 5% of the image size
+        if (right - left) < img_width * (1 - border_threshold) or (bottom - top) < img_height * (1 - border_threshold):
+            cropped_image = image.crop((left, top, right, bottom))
+        else:
+            cropped_image = image
+
+        # Categorize the image based on the cropped image's aspect ratio
+        category = categorize_image(cropped_image)
+
+    return cropped_image, category
+
+def remove_black_borders_and_categorize(image_path, output_dir, tolerance=5):
     """
     Removes consistent black borders from an image, categorizes it based on its aspect ratio,
     and saves the cropped image without resizing or deleting the source image.
     
     :param image_path: Path to the input image.
-    :param output_path: Path to save the processed image.
+    :param output_dir: Directory holding the category folders; the image is saved in its category's folder.
     :param tolerance: The threshold below which pixel values are considered "black".
     :return: True if successful, False otherwise.
     """
-    logging.info(f"Starting to process image: {image_path}")
     try:
-        # Open the image using a with statement to ensure the file handle is closed
-        with Image.open(image_path) as image:
-            logging.info("Opening the image...")
-            
-            # Convert RGBA to RGB if necessary
-            if image.mode == 'RGBA':
-                image = image.convert('RGB')
-            
-            image_np = np.array(image)
-            logging.info("Image opened successfully.")
-
-            # Detect consistent borders
-            logging.info("Detecting borders...")
-            left, top, right, bottom = detect_borders(image_np, tolerance)
-            
-            # Check if the borders are significant
-            img_width, img_height = image.size
-            border_threshold = 0.05  # 5% of the image size
-            if (right - left) < img_width * (1 - border_threshold) or (bottom - top) < img_height * (1 - border_threshold):
-                logging.info(f"Significant borders detected. Cropping image...")
-                cropped_image = image.crop((left, top, right, bottom))
-            else:
-                logging.info(f"No significant borders detected. Skipping crop.")
-                cropped_image = image
-
-            # Categorize the image based on the cropped image's aspect ratio
-            category = categorize_image(cropped_image)
-
-            # Save the cropped image to the output path
-            logging.info(f"Saving the cropped image to {output_path}...")
-            cropped_image.save(output_path)
-            logging.info(f"Image processed and saved successfully: {output_path}")
-        
+        cropped_image, category = crop_and_categorize(image_path, tolerance)
+
+        # Save the cropped image to its category folder
+        cropped_image.save(os.path.join(output_dir, category, os.path.basename(image_path)))
         return True  # Indicates success
 
     except Exception as e:
-        logging.error(f"Error processing {image_path}: {e}")
+        log.error("Error processing %s: %s", image_path, e)
         return False  # Indicates an error
 
+def process_batch(tasks, output_dir, tolerance=5):
+    """
+    Crops and categorizes a batch of images, handing each save to a small thread pool so the
+    encode and disk write overlap with decoding and cropping the next image.
+    Pillow releases the GIL while it encodes.
+    
+    :param tasks: List of (filename, input_path) tuples.
+    :param output_dir: Directory holding the category folders.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    :return: List of (filename, success) tuples.
+    """
+    results = []
+    saves = []
+    with ThreadPoolExecutor(max_workers=2) as save_pool:
+        for filename, input_path in tasks:
+            try:
+                cropped_image, category = crop_and_categorize(input_path, tolerance)
+            except Exception as e:
+                log.error("Error processing %s: %s", input_path, e)
+                results.append((filename, False))
+                continue
+            output_path = os.path.join(output_dir, category, filename)
+            saves.append((filename, input_path, save_pool.submit(cropped_image.save, output_path)))
+
+        # Collect the saves; leaving the with block waits for any still running
+        for filename, input_path, save in saves:
+            try:
+                save.result()
+                results.append((filename, True))
+            except Exception as e:
+                log.error("Error processing %s: %s", input_path, e)
+                results.append((filename, False))
+    return results
+
 def process_directory(input_dir, output_dir, tolerance=5):
     """
     Processes all images in the input directory, removing black borders and categorizing them.
@@ -133,57 +224,68 @@ def process_directory(input_dir, output_dir, tolerance=5):
     :param output_dir: Directory to save processed images.
     :param tolerance: The threshold below which pixel values are considered "black".
     """
-    logging.info(f"Starting to process directory: {input_dir}")
-    if not os.path.exists(output_dir):
-        logging.info(f"Output directory does not exist. Creating directory: {output_dir}")
-        os.makedirs(output_dir)
+    log.info("Starting to process directory: %s", input_dir)
 
-    # Create subdirectories for each category
+    # Create subdirectories for each category; makedirs also creates the output directory if it is missing
     categories = ["landscape", "extra_wide", "portrait", "extra_tall", "square"]
     for category in categories:
-        category_dir = os.path.join(output_dir, category)
-        if not os.path.exists(category_dir):
-            logging.info(f"Creating category directory: {category_dir}")
-            os.makedirs(category_dir)
+        os.makedirs(os.path.join(output_dir, category), exist_ok=True)
 
     # Count the processed images and errors
     processed_count = 0
     error_count = 0
     error_images = []
+    skipped_count = 0
+
+    with os.scandir(input_dir) as it:
+        entries = list(it)  # DirEntry caches the file type from the directory read, so is_file() needs no extra stat
+
+    tasks = []
+    for entry in entries:
+        filename = entry.name
+        input_path = entry.path
+        if filename.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+            tasks.append((filename, input_path))
+        else:
+            skipped_count += 1
+    log.info("Found %d images to process.", len(tasks))
 
-    for filename in os.listdir(input_dir):
-        input_path = os.path.join(input_dir, filename)
-        if os.path.isfile(input_path) and filename.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-            logging.info(f"Processing file: {filename}")
+    # Images are independent, so process them across all but one core, a small batch per job;
+    # each worker saves its batch in the background while it crops the next image
+    max_workers = max(1, (os.cpu_count() or 2) - 1)
+    batch_size = 8
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(process_batch, tasks[i:i + batch_size], output_dir, tolerance): tasks[i:i + batch_size]
+            for i in range(0, len(tasks), batch_size)
+        }
+        for future in as_completed(futures):
             try:
-                # Determine the output path based on the category
-                output_path = os.path.join(output_dir, filename)  # Default path
-                success = remove_black_borders_and_categorize(input_path, output_path, tolerance)
+                results = future.result()
+            except Exception as e:
+                log.error("Error processing batch starting at %s: %s", futures[future][0][0], e)
+                results = [(filename, False) for filename, _ in futures[future]]
+            for filename, success in results:
                 if success:
                     processed_count += 1
                 else:
                     error_count += 1
                     error_images.append(filename)
-            except Exception as e:
-                logging.error(f"Error processing {filename}: {e}")
-                error_count += 1
-                error_images.append(filename)
-        else:
-            logging.info(f"Skipping non-image file: {filename}")
 
-    logging.info(f"Directory processing complete.")
-    logging.info(f"Total images processed: {processed_count}")
-    logging.info(f"Total errors encountered: {error_count}")
+    log.info("Directory processing complete.")
+    log.info("Total images processed: %d", processed_count)
+    log.info("Total errors encountered: %d", error_count)
+    log.info("Non-image files skipped: %d", skipped_count)
 
     if error_count > 0:
-        logging.warning("Images that encountered errors:")
-        for error_image in error_images:
-            logging.warning(f"- {error_image}")
+        log.warning("Images that encountered errors:\n%s", "\n".join(f"- {error_image}" for error_image in error_images))
 
-# Input and output directories
-input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
-output_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Processed"
+# Guarded so worker processes can import this module without re-running the processing
+if __name__ == "__main__":
+    # Input and output directories
+    input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
+    output_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Processed"
 
-# Process all images in the directory
-process_directory(input_directory, output_directory)
-input("Processing complete. Press Enter to exit...")
\ No newline at end of file
+    # Process all images in the directory
+    process_directory(input_directory, output_directory)
+    input("Processing complete. Press Enter to exit...")
\ No newline at end of file
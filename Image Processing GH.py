@@ -1,87 +1,249 @@
 import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PIL import Image
 import numpy as np
 
-def remove_black_borders_and_resize(image_path, output_path, size=(512, 512), tolerance=5):
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # The package is missing, or it can't find the libturbojpeg library
+    turbo_jpeg = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+def load_image(image_path, size=None):
     """
-    Removes black borders from an image, resizes it to the specified size, 
-    and checks for black borders again after resizing.
+    Opens an image and decodes it fully as RGB.
     
     :param image_path: Path to the input image.
-    :param output_path: Path to save the processed image.
+    :param size: Tuple (width, height) the image will be resized to; JPEGs are decoded at a reduced
+                 scale that stays at least twice this size. None decodes at full resolution.
+    :return: PIL Image object in RGB mode.
+    """
+    with Image.open(image_path) as image:
+        if size and image.format == 'JPEG':
+            image.draft('RGB', (size[0] * 2, size[1] * 2))  # libjpeg skips most of the IDCT work at 1/2, 1/4 or 1/8 scale
+        # Convert RGBA, palette and grayscale images to RGB; convert() also forces the decode
+        image = image.convert('RGB') if image.mode != 'RGB' else image.copy()
+    return image
+
+# Walk in from each edge and stop at the first pixel with any channel above the tolerance, so thin borders
+# only cost a few rows and columns. Returns (left, top, right, bottom), or all -1 if nothing is above it.
+def scan_content_bbox(pixels, tolerance):
+    height, width = pixels.shape[0], pixels.shape[1]
+
+    top = -1
+    for y in range(height):
+        for x in range(width):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                top = y
+                break
+        if top >= 0:
+            break
+    if top < 0:
+        return -1, -1, -1, -1
+
+    bottom = top + 1
+    for y in range(height - 1, top, -1):
+        for x in range(width):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                bottom = y + 1
+                break
+        if bottom > top + 1:
+            break
+
+    # The columns only need checking between the top and bottom content rows
+    left = -1
+    for x in range(width):
+        for y in range(top, bottom):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                left = x
+                break
+        if left >= 0:
+            break
+
+    right = left + 1
+    for x in range(width - 1, left, -1):
+        for y in range(top, bottom):
+            if pixels[y, x, 0] > tolerance or pixels[y, x, 1] > tolerance or pixels[y, x, 2] > tolerance:
+                right = x + 1
+                break
+        if right > left + 1:
+            break
+
+    return left, top, right, bottom
+
+if njit is not None:
+    scan_content_bbox = njit(cache=True)(scan_content_bbox)
+
+def find_content_bbox(image, tolerance=5):
+    """
+    Finds the bounding box of pixels where any band is above the tolerance.
+    
+    :param image: PIL Image object in RGB mode.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    :return: Tuple (left, top, right, bottom), or None if the image has no non-black content.
+    """
+    # Borderless images are common: if all four corners are content, the box is the whole frame and no scan is needed
+    width, height = image.size
+    corners = (image.getpixel((0, 0)), image.getpixel((width - 1, 0)), image.getpixel((0, height - 1)), image.getpixel((width - 1, height - 1)))
+    if all(max(corner) > tolerance for corner in corners):
+        return 0, 0, width, height
+
+    # With Numba, scan the pixels directly; the array copy is a plain memcpy and the scan stops at the content edges
+    if njit is not None:
+        left, top, right, bottom = scan_content_bbox(np.asarray(image), tolerance)
+        return None if top < 0 else (left, top, right, bottom)
+
+    # Threshold every band, then getbbox() returns the box of pixels where any band is non-zero
+    threshold_lut = [255 if value > tolerance else 0 for value in range(256)] * len(image.getbands())
+    return image.point(threshold_lut).getbbox()
+
+def crop_and_resize(image, size=(512, 512), tolerance=5):
+    """
+    Removes black borders from an image and resizes it to the specified size.
+    
+    :param image: PIL Image object in RGB mode.
     :param size: Tuple (width, height) to resize the output image to.
     :param tolerance: The threshold below which pixel values are considered "black".
+    :return: The resized PIL Image, or None if the image has no non-black content.
     """
-    print(f"Starting to process image: {image_path}")
-    try:
-        # Open the image
-        print("Opening the image...")
-        image = Image.open(image_path)
-        
-        # Convert RGBA to RGB if necessary
-        if image.mode == 'RGBA':
-            image = image.convert('RGB')
-        
-        image_np = np.array(image)
-        print("Image opened successfully.")
-
-        # Find the bounding box of non-black content, considering the tolerance
-        print("Calculating the bounding box for non-black content...")
-        mask = np.all(image_np > tolerance, axis=-1)
-        coords = np.argwhere(mask)
-
-        if coords.size == 0:
-            print(f"No non-black content found in {image_path}. Skipping this image.")
-            return False  # Indicates an error
+    # Find the bounding box of non-black content
+    bbox = find_content_bbox(image, tolerance)
 
-        # Get the bounding box
-        print("Determining the bounding box coordinates...")
-        x0, y0 = coords.min(axis=0)
-        x1, y1 = coords.max(axis=0) + 1  # +1 to include the last row/column
-        print(f"Bounding box determined: Top-left({x0}, {y0}), Bottom-right({x1}, {y1}).")
-
-        # Check if the bounding box is almost the same as the image size (skip crop if true)
-        img_width, img_height = image.size
-        bbox_width = x1 - x0
-        bbox_height = y1 - y0
-
-        # If the bounding box is close to the image size (e.g., 95% or more of the image), skip cropping
-        if bbox_width >= img_width * 0.95 and bbox_height >= img_height * 0.95:
-            print(f"Bounding box is nearly the same size as the image. Skipping crop.")
-            cropped_image = image
-        else:
-            print("Cropping the image...")
-            cropped_image = image.crop((y0, x0, y1, x1))
+    if bbox is None:
+        return None
 
-        # Resize the image
-        print("Resizing the image...")
-        resized_image = cropped_image.resize(size, Image.Resampling.LANCZOS)
+    # Get the bounding box
+    left, top, right, bottom = bbox
 
-        # Check for black borders again after resizing
-        resized_image_np = np.array(resized_image)
-        print("Checking for black borders after resizing...")
-        mask_resized = np.all(resized_image_np > tolerance, axis=-1)
-        coords_resized = np.argwhere(mask_resized)
+    # Check if the bounding box is almost the same as the image size (skip crop if true)
+    img_width, img_height = image.size
+    bbox_width = right - left
+    bbox_height = bottom - top
 
-        if coords_resized.size == 0:
-            print(f"After resizing, the image is entirely black. Skipping this image.")
-            return False  # Indicates an error
+    # If the bounding box is close to the image size (e.g., 95% or more of the image), skip cropping
+    if bbox_width >= img_width * 0.95 and bbox_height >= img_height * 0.95:
+        left, top, right, bottom = 0, 0, img_width, img_height
+        bbox_width, bbox_height = img_width, img_height
 
-        # Save the processed image
-        print(f"Saving the processed image to {output_path}...")
+    # Resize the image: box-reduce by an integer factor first, then Lanczos the remainder (what reducing_gap=2.0 does).
+    # reduce() reads only the pixels inside the box, so no cropped copy is made; resize(box=...) alone would
+    # let the filter sample the black border just outside the box into the edge pixels.
+    factor = (max(1, int(bbox_width / size[0] / 2.0)), max(1, int(bbox_height / size[1] / 2.0)))
+    if factor == (1, 1):
+        resized_image = image.crop((left, top, right, bottom)).resize(size, Image.Resampling.LANCZOS)
+    else:
+        reduced_image = image.reduce(factor, (left, top, right, bottom))
+        # The last reduced row and column may cover a partial block; the box keeps to the part inside the content
+        resized_image = reduced_image.resize(size, Image.Resampling.LANCZOS, box=(0, 0, bbox_width / factor[0], bbox_height / factor[1]))
+
+    # No second black check: the crop is bounded by content above the tolerance, so only a crop of a few faint specks
+    # could average out to black, which isn't worth scanning every resized image for
+    return resized_image
+
+def save_and_remove(resized_image, image_path, output_path):
+    """
+    Saves the processed image and deletes the original raw file.
+    
+    :param resized_image: PIL Image object to save.
+    :param image_path: Path to the original raw file.
+    :param output_path: Path to save the processed image.
+    """
+    if turbo_jpeg is not None and output_path.lower().endswith(('.jpg', '.jpeg')):
+        # Encode straight from the pixel buffer with libjpeg-turbo, at Pillow's default quality and chroma subsampling.
+        # The file is only opened once encoding has succeeded, so a failure doesn't leave an empty output behind.
+        encoded = turbo_jpeg.encode(np.asarray(resized_image), quality=75, pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+        with open(output_path, 'wb') as file:
+            file.write(encoded)
+    else:
         resized_image.save(output_path)
-        print(f"Image processed and saved successfully: {output_path}")
-        
-        # Delete the original raw file after processing
-        print(f"Deleting the original file: {image_path}")
-        os.remove(image_path)
 
+    # Delete the original raw file after processing
+    os.remove(image_path)
+
+def remove_black_borders_and_resize(image_path, output_path, size=(512, 512), tolerance=5):
+    """
+    Removes black borders from an image and resizes it to the specified size.
+    
+    :param image_path: Path to the input image.
+    :param output_path: Path to save the processed image.
+    :param size: Tuple (width, height) to resize the output image to.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    """
+    try:
+        resized_image = crop_and_resize(load_image(image_path, size), size, tolerance)
+        if resized_image is None:
+            print(f"No non-black content found in {image_path}. Skipping this image.")
+            return False  # Indicates an error
+        save_and_remove(resized_image, image_path, output_path)
         return True  # Indicates success
 
     except Exception as e:
         print(f"Error processing {image_path}: {e}")
         return False  # Indicates an error
 
+def process_batch(tasks, size=(512, 512), tolerance=5):
+    """
+    Runs a batch of images through a read -> process -> write pipeline of three threads,
+    so decoding the next image and encoding the previous one overlap with the crop and resize.
+    Pillow releases the GIL while it decodes, resizes and encodes.
+    
+    :param tasks: List of (filename, input_path, output_path) tuples.
+    :param size: Tuple (width, height) to resize the output images to.
+    :param tolerance: The threshold below which pixel values are considered "black".
+    :return: List of (filename, error) tuples; error is None on success, otherwise the message for the summary.
+    """
+    to_process = queue.Queue(maxsize=4)
+    to_write = queue.Queue(maxsize=4)
+    results = []  # list.append is atomic, so every stage can record failures
+    # Messages travel back with the results and are printed once in the summary, not per image from every worker
+
+    def read_stage():
+        for filename, input_path, output_path in tasks:
+            try:
+                to_process.put((filename, input_path, output_path, load_image(input_path, size)))
+            except Exception as e:
+                results.append((filename, f"Error processing {input_path}: {e}"))
+        to_process.put(None)
+
+    def process_stage():
+        while (item := to_process.get()) is not None:
+            filename, input_path, output_path, image = item
+            try:
+                resized_image = crop_and_resize(image, size, tolerance)
+            except Exception as e:
+                results.append((filename, f"Error processing {input_path}: {e}"))
+                continue
+            if resized_image is None:
+                results.append((filename, f"No non-black content found in {input_path}. Skipping this image."))
+            else:
+                to_write.put((filename, input_path, output_path, resized_image))
+        to_write.put(None)
+
+    def write_stage():
+        while (item := to_write.get()) is not None:
+            filename, input_path, output_path, resized_image = item
+            try:
+                save_and_remove(resized_image, input_path, output_path)
+                results.append((filename, None))
+            except Exception as e:
+                results.append((filename, f"Error processing {input_path}: {e}"))
+
+    stages = [threading.Thread(target=stage) for stage in (read_stage, process_stage, write_stage)]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    return results
+
 def process_directory(input_dir, output_dir, size=(512, 512), tolerance=5):
     """
     Processes all images in the input directory, removing black borders and resizing.
@@ -92,44 +254,59 @@ def process_directory(input_dir, output_dir, size=(512, 512), tolerance=5):
     :param tolerance: The threshold below which pixel values are considered "black".
     """
     print(f"Starting to process directory: {input_dir}")
-    if not os.path.exists(output_dir):
-        print(f"Output directory does not exist. Creating directory: {output_dir}")
-        os.makedirs(output_dir)
-    else:
-        print(f"Output directory exists: {output_dir}")
+    os.makedirs(output_dir, exist_ok=True)
 
     # Count the processed images and errors
     processed_count = 0
     error_count = 0
     error_images = []
+    skipped_count = 0
 
-    for filename in os.listdir(input_dir):
-        input_path = os.path.join(input_dir, filename)
-        if os.path.isfile(input_path) and filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            print(f"Processing file: {filename}")
-            output_path = os.path.join(output_dir, filename)
-            success = remove_black_borders_and_resize(input_path, output_path, size, tolerance)
-            if success:
-                processed_count += 1
-            else:
-                error_count += 1
-                error_images.append(filename)
+    with os.scandir(input_dir) as it:
+        entries = list(it)  # DirEntry caches the file type from the directory read, so is_file() needs no extra stat
+
+    tasks = []
+    for entry in entries:
+        filename = entry.name
+        input_path = entry.path
+        if filename.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+            tasks.append((filename, input_path, os.path.join(output_dir, filename)))
         else:
-            print(f"Skipping non-image file: {filename}")
+            skipped_count += 1
+    print(f"Found {len(tasks)} images to process.")
+
+    # Images are independent, so process them across all but one core, a small batch per job;
+    # each worker pipelines its batch so reading, processing and writing overlap
+    max_workers = max(1, (os.cpu_count() or 2) - 1)
+    batch_size = 8
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(process_batch, tasks[i:i + batch_size], size, tolerance)
+            for i in range(0, len(tasks), batch_size)
+        ]
+        for future in as_completed(futures):
+            for filename, error in future.result():
+                if error is None:
+                    processed_count += 1
+                else:
+                    error_count += 1
+                    error_images.append(error)
 
     print(f"Directory processing complete.")
     print(f"Total images processed: {processed_count}")
     print(f"Total errors encountered: {error_count}")
+    print(f"Non-image files skipped: {skipped_count}")
 
     if error_count > 0:
         print("Images that encountered errors:")
-        for error_image in error_images:
-            print(f"- {error_image}")
+        print("\n".join(f"- {error_image}" for error_image in error_images))
 
-# Input and output directories
-input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
-output_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Processed"
+# Guarded so worker processes can import this module without re-running the processing
+if __name__ == "__main__":
+    # Input and output directories
+    input_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Raw"
+    output_directory = r"C:\Users\Sabbo\LifeDrawingGallery\Processed"
 
-# Process all images in the directory
-process_directory(input_directory, output_directory)
-input("Processing complete. Press Enter to exit...")
+    # Process all images in the directory
+    process_directory(input_directory, output_directory)
+    input("Processing complete. Press Enter to exit...")
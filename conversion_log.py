@@ -17,6 +17,22 @@ def test_imagemagick_cli():
     except FileNotFoundError:
         print("ImageMagick command-line tool not found. Please ensure it's installed and in your PATH.")
 
+# Convert a list of images to DDS through Wand, which drives ImageMagick's library inside this process.
+# Shelling out to `convert` per file pays a fork and exec plus ImageMagick start-up for every image;
+# here it is paid once. Returns the paths that failed to convert.
+def convert_to_dds_with_wand(input_paths, output_dir):
+    failed = []
+    for input_path in input_paths:
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".dds")
+        try:
+            with Image(filename=input_path) as img:
+                img.format = 'dds'
+                img.save(filename=output_path)
+        except Exception as e:
+            print(f"Failed to convert {input_path}: {e}")
+            failed.append(input_path)
+    return failed
+
 # Function to test Wand (ImageMagick's Python binding)
 def test_wand():
     try:
@@ -32,10 +48,8 @@ def test_wand():
                 img.caption("Test Image", left=50, top=40)
                 img.save(filename=test_image_path)
 
-        # Open the image with Wand and convert it to DDS
-        with Image(filename=test_image_path) as img:
-            img.format = 'dds'
-            img.save(filename="test_image_output.dds")
+        # Convert the image to DDS the same way a batch would be
+        if not convert_to_dds_with_wand([test_image_path], "."):
             print("Image converted successfully to DDS format using Wand!")
 
     except Exception as e: